@@ -3,8 +3,25 @@ import csv
 import os
 import logging
 import argparse
-from concurrent.futures import ThreadPoolExecutor
+import contextlib
+import functools
+import queue
+import sys
+import threading
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from boto3.s3.transfer import TransferConfig, create_transfer_manager
+from botocore.client import Config
 from botocore.exceptions import ClientError
+from s3transfer.processpool import ProcessPoolDownloader, ProcessTransferConfig
+from s3transfer.subscribers import BaseSubscriber
+
+def positive_int(value):
+    """Argparse type for integers of at least 1."""
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be a positive integer, got {value}")
+    return number
 
 def parse_arguments():
     """Parse command line arguments."""
@@ -23,15 +40,40 @@ def parse_arguments():
                         help='AWS region (default: us-west-2)')
     
     parser.add_argument('--workers', type=int, default=3,
-                        help='Number of download workers (default: 3)')
+                        help='Number of worker processes for video downloads (default: 3)')
+    
+    parser.add_argument('--max-inflight', type=positive_int, default=64,
+                        help='Maximum number of S3 requests in flight at once, at least 3 (default: 64)')
+    
+    parser.add_argument('--scan-segments', type=positive_int, default=4,
+                        help='Number of parallel DynamoDB scan segments (default: 4)')
+    
+    parser.add_argument('--dataset-tag', type=str, default=None,
+                        help='Query the dataset_tag GSI for this tag instead of scanning the table (e.g. MP_v1)')
+    
+    parser.add_argument('--index-name', type=str, default='dataset_tag-index',
+                        help='Name of the GSI partitioned by dataset_tag (default: dataset_tag-index)')
     
     parser.add_argument('--quality-threshold', type=float, default=0.0,
                         help='Minimum quality score threshold for videos to process (default: 0.0)')
     
+    parser.add_argument('--force', action='store_true',
+                        help='Re-download files even if they already exist locally with the same size')
+    
     parser.add_argument('--log-level', type=str, choices=['DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL'],
                         default='INFO', help='Logging level (default: INFO)')
     
-    return parser.parse_args()
+    args = parser.parse_args()
+    
+    # Each entry needs one slot for each of its three files
+    if args.max_inflight < 3:
+        parser.error('--max-inflight must be at least 3')
+    
+    # DynamoDB rejects TotalSegments above this, which would otherwise only surface mid-run
+    if args.scan_segments > 1000000:
+        parser.error('--scan-segments must be at most 1000000')
+    
+    return args
 
 def setup_logging(log_level):
     """Set up logging with the specified log level."""
@@ -42,122 +84,411 @@ def setup_logging(log_level):
     logging.basicConfig(level=numeric_level, format='%(asctime)s - %(levelname)s - %(message)s')
     return logging.getLogger(__name__)
 
+def create_s3_client(region, workers, max_inflight):
+    """Create an S3 client whose connection pool is sized for the download concurrency."""
+    # The default pool of 10 connections silently serializes threads once workers * 3 exceeds it
+    config = Config(max_pool_connections=max(workers * 4, max_inflight, (os.cpu_count() or 1) * 5),
+                    retries={'max_attempts': 10, 'mode': 'adaptive'},
+                    tcp_keepalive=True)
+    return boto3.client('s3', region_name=region, config=config)
+
 def parse_s3_path(s3_path):
     """Parse an S3 path into bucket name and key."""
     if not s3_path.startswith('s3://'):
         raise ValueError(f"Invalid S3 path: {s3_path}")
     
-    path_without_prefix = s3_path[5:]
-    parts = path_without_prefix.split('/', 1)
+    bucket, separator, key = s3_path[5:].partition('/')
     
-    if len(parts) != 2:
+    if not separator:
         raise ValueError(f"Invalid S3 path format: {s3_path}")
     
-    bucket = parts[0]
-    key = parts[1]
-    
     return bucket, key
 
-def download_from_s3(s3_path, local_path, s3_client, logger):
-    """Download a file from S3 to local storage and return the absolute path."""
+def head_s3_object(s3_path, s3_client, logger):
+    """Return the size of an S3 object, or None if it is missing or inaccessible."""
+    try:
+        bucket, key = parse_s3_path(s3_path)
+        return s3_client.head_object(Bucket=bucket, Key=key)['ContentLength']
+    except ClientError as e:
+        logger.error("Error checking %s: %s", s3_path, e)
+        return None
+
+def is_already_downloaded(local_path, size):
+    """Check whether the local file exists and matches the size of the S3 object."""
+    try:
+        return os.stat(local_path).st_size == size
+    except FileNotFoundError:
+        return False
+
+class ProvideSizeSubscriber(BaseSubscriber):
+    """Hand a transfer the object size we already know so s3transfer skips its own HeadObject."""
+    
+    def __init__(self, size):
+        self.size = size
+    
+    def on_queued(self, future, **kwargs):
+        future.meta.provide_transfer_size(self.size)
+
+def download_preallocated(bucket, key, local_path, size, transfer_manager):
+    """Download an S3 object into a file whose full size is allocated up front."""
+    # Unlike ProcessPoolDownloader for videos, the threaded transfer manager does not preallocate
+    # its output, so audio and landmark files reserve their extents here
+    # Write to a uniquely named side file so an interrupted download never looks complete to the
+    # resume check, and two transfers can never share one partial file
+    partial_path = f"{local_path}.{uuid.uuid4().hex}.part"
+    try:
+        # Exclusive creation keeps the usual umask-based permissions, unlike mkstemp's 0600
+        with open(partial_path, 'xb') as f:
+            # Reserving every extent before the ranged writes land avoids fragmentation
+            if size and hasattr(os, 'posix_fallocate'):
+                os.posix_fallocate(f.fileno(), 0, size)
+            transfer_manager.download(bucket, key, f, subscribers=[ProvideSizeSubscriber(size)]).result()
+        os.replace(partial_path, local_path)
+    except Exception:
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+        raise
+
+def download_from_s3(s3_path, local_path, size, transfer_manager, force, logger):
+    """Download a file of known size from S3 to local storage and return the absolute path."""
+    try:
+        bucket, key = parse_s3_path(s3_path)
+        if not force and is_already_downloaded(local_path, size):
+            logger.debug("Skipping %s, already downloaded to %s", s3_path, local_path)
+            return local_path
+        logger.debug("Downloading %s to %s", s3_path, local_path)
+        download_preallocated(bucket, key, local_path, size, transfer_manager)
+        return local_path
+    except ClientError as e:
+        logger.error("Error downloading %s: %s", s3_path, e)
+        return None
+
+def download_from_s3_with_processes(s3_path, local_path, size, downloader, force, logger):
+    """Download a large file of known size from S3 using worker processes and return the absolute path."""
     try:
         bucket, key = parse_s3_path(s3_path)
-        logger.info(f"Downloading {s3_path} to {local_path}")
-        s3_client.download_file(bucket, key, local_path)
-        return os.path.abspath(local_path)
+        if not force and is_already_downloaded(local_path, size):
+            logger.debug("Skipping %s, already downloaded to %s", s3_path, local_path)
+            return local_path
+        logger.debug("Downloading %s to %s", s3_path, local_path)
+        # The transfer itself runs in the downloader's processes; this thread only waits on it.
+        # Passing the size up front lets the downloader skip its own HeadObject call, and the
+        # downloader fallocates a uniquely named temp file of that size before any ranged writes
+        # land, so videos get the same preallocation that download_preallocated gives small files.
+        downloader.download_file(bucket, key, local_path, expected_size=size).result()
+        return local_path
     except ClientError as e:
-        logger.error(f"Error downloading {s3_path}: {e}")
+        logger.error("Error downloading %s: %s", s3_path, e)
         return None
 
-def download_files(entry, download_base_dir, s3_client, workers, logger):
-    """Download video, audio, and landmarks files for an entry."""
+def entry_read_kwargs(quality_threshold):
+    """Build the projection and filter arguments shared by scans and queries."""
+    return {
+        'Select': 'SPECIFIC_ATTRIBUTES',
+        'ProjectionExpression': 'video_id, video_path, audio_path, landmarks_raw_path, quality_score',
+        # Filter server-side so only matching items are sent over the wire
+        'FilterExpression': 'contains(landmarks_raw_path, :mp) AND quality_score >= :q',
+        'ExpressionAttributeValues': {':mp': {'S': 'MP'}, ':q': {'N': str(quality_threshold)}},
+    }
+
+def deserialize_entry(item):
+    """Convert a low-level DynamoDB item into a plain dict of the projected fields."""
+    return {
+        'video_id': item['video_id']['S'],
+        'video_path': item['video_path']['S'],
+        'audio_path': item['audio_path']['S'],
+        'landmarks_raw_path': item['landmarks_raw_path']['S'],
+        'quality_score': float(item['quality_score']['N']),
+    }
+
+def iter_pages(dynamodb_client, operation_name, **kwargs):
+    """Paginate a DynamoDB client operation and yield the deserialized items of each page as it arrives."""
+    paginator = dynamodb_client.get_paginator(operation_name)
+    for page in paginator.paginate(**kwargs):
+        yield [deserialize_entry(item) for item in page.get('Items', [])]
+
+def put_until_stopped(page_queue, item, stop):
+    """Put an item on a bounded queue, giving up once the consumer has stopped; return whether it was queued."""
+    while not stop.is_set():
+        try:
+            page_queue.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            pass
+    return False
+
+def scan_segment(dynamodb_client, table_name, segment, total_segments, quality_threshold, page_queue, stop):
+    """Scan a single segment of a DynamoDB table, putting each page on the queue."""
+    try:
+        for page in iter_pages(dynamodb_client, 'scan', TableName=table_name, Segment=segment,
+                               TotalSegments=total_segments, **entry_read_kwargs(quality_threshold)):
+            if not put_until_stopped(page_queue, page, stop):
+                return
+    except BaseException:
+        # One failed segment means the table cannot be read completely, so stop the others too
+        stop.set()
+        raise
+    finally:
+        # A None on the queue marks one finished segment
+        put_until_stopped(page_queue, None, stop)
+
+def scan_table(table_name, region, total_segments, quality_threshold):
+    """Scan a DynamoDB table using parallel segments and yield pages of matching items."""
+    # Low-level clients are thread-safe, so all segments share one sized to their count
+    dynamodb_client = boto3.client('dynamodb', region_name=region,
+                                   config=Config(max_pool_connections=max(total_segments, 10),
+                                                 retries={'max_attempts': 10, 'mode': 'adaptive'}))
+    # The bounded queue makes segments wait while downloads catch up, so only a few pages are held
+    page_queue = queue.Queue(maxsize=total_segments * 2)
+    stop = threading.Event()
+    
+    with ThreadPoolExecutor(max_workers=total_segments) as scan_executor:
+        futures = [scan_executor.submit(scan_segment, dynamodb_client, table_name, segment,
+                                       total_segments, quality_threshold, page_queue, stop)
+                   for segment in range(total_segments)]
+        try:
+            remaining = len(futures)
+            while remaining:
+                try:
+                    page = page_queue.get(timeout=0.1)
+                except queue.Empty:
+                    # Only a failed segment sets stop while we are still reading
+                    if stop.is_set():
+                        break
+                    continue
+                if page is None:
+                    remaining -= 1
+                    continue
+                yield page
+        finally:
+            # Releases segments blocked on a full queue if the generator is closed early
+            stop.set()
+    
+    # Re-raise the error from a segment that failed
+    for future in futures:
+        future.result()
+
+def query_index(table_name, region, index_name, dataset_tag, quality_threshold):
+    """Query a dataset_tag GSI for pages of matching items instead of scanning the whole table."""
+    dynamodb_client = boto3.client('dynamodb', region_name=region,
+                                   config=Config(retries={'max_attempts': 10, 'mode': 'adaptive'}))
+    
+    read_kwargs = entry_read_kwargs(quality_threshold)
+    read_kwargs['ExpressionAttributeValues'][':tag'] = {'S': dataset_tag}
+    
+    # The MP filter is kept so results stay correct even if the tag does not imply it
+    yield from iter_pages(dynamodb_client, 'query', TableName=table_name, IndexName=index_name,
+                          KeyConditionExpression='dataset_tag = :tag', **read_kwargs)
+
+def remember_result(scheduled, scheduled_lock, key, future):
+    """Replace a finished future in the schedule with its result, or None if it failed."""
+    with scheduled_lock:
+        scheduled[key] = None if future.exception() is not None else future.result()
+
+def submit_once(executor, scheduled, scheduled_lock, key, fn, *args):
+    """Submit fn unless the same request is already running or done, and return a future for it."""
+    # Rows that share a source file reuse the request already scheduled for it
+    with scheduled_lock:
+        if key not in scheduled:
+            future = executor.submit(fn, *args)
+            scheduled[key] = future
+        elif isinstance(scheduled[key], Future):
+            return scheduled[key]
+        else:
+            # Finished requests keep only their result, so later rows get a fresh completed future
+            # instead of one whose callbacks still reference every earlier entry
+            future = Future()
+            future.set_result(scheduled[key])
+            return future
+    
+    # Added outside the lock because an already finished future runs the callback immediately
+    future.add_done_callback(functools.partial(remember_result, scheduled, scheduled_lock, key))
+    return future
+
+def download_files(entry, download_dirs, s3_client, transfer_manager, video_downloader, executor,
+                   scheduled, scheduled_lock, force, logger):
+    """Schedule video, audio, and landmarks downloads for an entry and return a future for its result."""
     video_id = entry['video_id']
-    quality_score = float(entry.get('quality_score', 0.0))
+    quality_score = entry['quality_score']
     
     video_path = entry['video_path']
     audio_path = entry['audio_path']
     landmarks_path = entry['landmarks_raw_path']
     
-    rel_video_path = os.path.join(download_base_dir, 'video', os.path.basename(video_path))
-    rel_audio_path = os.path.join(download_base_dir, 'audio', os.path.basename(audio_path))
-    rel_landmark_path = os.path.join(download_base_dir, 'landmarks', os.path.basename(landmarks_path))
+    # download_dirs holds absolute paths, so plain string joins are enough here
+    local_video_path = f"{download_dirs['video']}/{video_path.rsplit('/', 1)[-1]}"
+    local_audio_path = f"{download_dirs['audio']}/{audio_path.rsplit('/', 1)[-1]}"
+    local_landmark_path = f"{download_dirs['landmarks']}/{landmarks_path.rsplit('/', 1)[-1]}"
     
-    local_video_path = os.path.abspath(rel_video_path)
-    local_audio_path = os.path.abspath(rel_audio_path)
-    local_landmark_path = os.path.abspath(rel_landmark_path)
+    file_paths = {
+        'local_video_path': (video_path, local_video_path),
+        'local_audio_path': (audio_path, local_audio_path),
+        'local_landmark_path': (landmarks_path, local_landmark_path),
+    }
     
     results = {}
     results['video_id'] = video_id
     results['quality_score'] = quality_score
     
-    with ThreadPoolExecutor(max_workers=workers) as executor:
-        video_future = executor.submit(download_from_s3, video_path, local_video_path, s3_client, logger)
-        audio_future = executor.submit(download_from_s3, audio_path, local_audio_path, s3_client, logger)
-        landmark_future = executor.submit(download_from_s3, landmarks_path, local_landmark_path, s3_client, logger)
+    entry_future = Future()
+    lock = threading.Lock()
+    sizes = {}
+    remaining = len(file_paths)
+    
+    def submit_download(field, size):
+        s3_path, local_path = file_paths[field]
+        # Local names come from the key's basename, so distinct keys can collide on one destination
+        with scheduled_lock:
+            owner = scheduled.setdefault(('owner', local_path), s3_path)
+        if owner != s3_path:
+            logger.error("Skipping %s: %s is already the destination for %s", s3_path, local_path, owner)
+            future = Future()
+            future.set_result(None)
+            return future
+        if field == 'local_video_path':
+            return submit_once(executor, scheduled, scheduled_lock, ('download', local_path),
+                               download_from_s3_with_processes, s3_path, local_path, size,
+                               video_downloader, force, logger)
+        return submit_once(executor, scheduled, scheduled_lock, ('download', local_path),
+                           download_from_s3, s3_path, local_path, size, transfer_manager, force, logger)
+    
+    def on_file_done(field, future):
+        nonlocal remaining
+        with lock:
+            if entry_future.done():
+                return
+            if future.exception() is not None:
+                entry_future.set_exception(future.exception())
+                return
+            results[field] = future.result()
+            remaining -= 1
+            if not remaining:
+                entry_future.set_result(results)
+    
+    def on_head_done(field, future):
+        with lock:
+            if entry_future.done():
+                return
+            if future.exception() is not None:
+                entry_future.set_exception(future.exception())
+                return
+            sizes[field] = future.result()
+            if len(sizes) < len(file_paths):
+                return
+            # Drop the entry before any transfer starts if one of its objects is missing
+            if None in sizes.values():
+                results.update(dict.fromkeys(file_paths))
+                entry_future.set_result(results)
+                return
         
-        results['local_video_path'] = video_future.result()
-        results['local_audio_path'] = audio_future.result()
-        results['local_landmark_path'] = landmark_future.result()
+        for download_field, size in sizes.items():
+            submit_download(download_field, size).add_done_callback(functools.partial(on_file_done, download_field))
+    
+    # HEAD requests are a single round trip, so check every object before committing to downloads
+    for field, (s3_path, _) in file_paths.items():
+        head_future = submit_once(executor, scheduled, scheduled_lock, ('head', s3_path),
+                                  head_s3_object, s3_path, s3_client, logger)
+        head_future.add_done_callback(functools.partial(on_head_done, field))
     
-    return results
+    return entry_future
 
-def process_dynamo_entries(table_name, download_base_dir, region, workers, quality_threshold, logger):
-    """Process entries from DynamoDB table."""
-    dynamodb = boto3.resource('dynamodb', region_name=region)
-    s3 = boto3.client('s3', region_name=region)
+def process_dynamo_entries(table_name, region, scan_segments, dataset_tag, index_name, quality_threshold, logger):
+    """Yield matching entries from DynamoDB table page by page."""
+    count = 0
     
-    table = dynamodb.Table(table_name)
-    results = []
+    if dataset_tag:
+        pages = query_index(table_name, region, index_name, dataset_tag, quality_threshold)
+    else:
+        pages = scan_table(table_name, region, scan_segments, quality_threshold)
     
     try:
-        response = table.scan()
-        items = response.get('Items', [])
-        
-        # Process additional pages if DynamoDB returns them
-        while 'LastEvaluatedKey' in response:
-            response = table.scan(ExclusiveStartKey=response['LastEvaluatedKey'])
-            items.extend(response.get('Items', []))
+        for page in pages:
+            count += len(page)
+            yield from page
     except ClientError as e:
-        logger.error(f"Error scanning DynamoDB table: {e}")
-        return []
-    
-    logger.info(f"Found {len(items)} entries in DynamoDB table")
-    
-    filtered_entries = []
-    for item in items:
-        landmarks_path = item.get('landmarks_raw_path', '')
-        quality_score = float(item.get('quality_score', 0.0))
-        
-        if ('MP' in landmarks_path and
-            quality_score >= quality_threshold):
-            filtered_entries.append(item)
-    
-    logger.info(f"Filtered to {len(filtered_entries)} entries with 'MP' in landmarks path and quality score >= {quality_threshold}")
-    
-    for entry in filtered_entries:
-        result = download_files(entry, download_base_dir, s3, workers, logger)
-        if all(result.values()):  
-            results.append(result)
-    
-    return results
+        # Re-raise so a partial read fails the run instead of producing a truncated CSV
+        logger.error(f"Error reading DynamoDB table after {count} entries: {e}")
+        raise
+    finally:
+        # Stop the scan segments promptly if the consumer goes away
+        pages.close()
+    
+    logger.info(f"Found {count} entries with 'MP' in landmarks path and quality score >= {quality_threshold}")
 
-def write_to_csv(results, output_file, logger):
-    """Write results to CSV file."""
-    if not results:
-        logger.warning("No results to write to CSV")
-        return
+def download_entries(entries, download_dirs, s3, executor, video_downloader, max_inflight, force, csvfile, logger):
+    """Download files for entries as they arrive and write each complete row to the CSV as it finishes."""
+    # Audio and landmark files are fetched in-thread to avoid IPC overhead on small objects.
+    # One long-lived transfer manager serves all of them, so its thread pool is created once
+    # and sized to the in-flight cap instead of spawning a fresh pool for every file.
+    transfer_config = TransferConfig(multipart_threshold=8 * 1024 * 1024,
+                                     multipart_chunksize=8 * 1024 * 1024,
+                                     max_concurrency=max_inflight,
+                                     max_io_queue=1000,
+                                     io_chunksize=512 * 1024,
+                                     use_threads=True)
     
     fieldnames = ['video_id', 'local_video_path', 'local_audio_path', 'local_landmark_path', 'quality_score']
+    path_fields = ('local_video_path', 'local_audio_path', 'local_landmark_path')
+    writer = csv.writer(csvfile)
+    writer.writerow(fieldnames)
+    csv_lock = threading.Lock()
+    # Completed rows are batched as tuples and written together with each flush
+    pending_rows = []
+    written = 0
+    failed = 0
+    
+    # Each entry schedules three requests; capping entries keeps bursts of GETs below the point
+    # where S3 starts answering SlowDown, and bounds how far the scan can run ahead
+    max_inflight_entries = max_inflight // 3
+    inflight = threading.BoundedSemaphore(max_inflight_entries)
+    
+    def on_entry_done(video_id, entry_future):
+        nonlocal written, failed
+        try:
+            if entry_future.exception() is not None:
+                logger.error("Error downloading files for %s: %s", video_id, entry_future.exception())
+                with csv_lock:
+                    failed += 1
+                return
+            result = entry_future.result()
+            with csv_lock:
+                # Only the paths say whether a download failed; a quality_score of 0.0 is a valid row
+                if not all(result[field] for field in path_fields):
+                    failed += 1
+                    return
+                pending_rows.append(tuple(result[field] for field in fieldnames))
+                # Flush periodically so progress survives a crash
+                if len(pending_rows) >= 100:
+                    writer.writerows(pending_rows)
+                    csvfile.flush()
+                    written += len(pending_rows)
+                    pending_rows.clear()
+        finally:
+            inflight.release()
+    
+    # Maps each S3 path's HEAD and each local destination's download to a running future, or to its
+    # result once it finishes, shared by every row that references it; also records which S3 path
+    # owns each destination
+    scheduled = {}
+    scheduled_lock = threading.Lock()
+    
+    with create_transfer_manager(s3, transfer_config) as transfer_manager:
+        for entry in entries:
+            inflight.acquire()
+            entry_future = download_files(entry, download_dirs, s3, transfer_manager, video_downloader,
+                                          executor, scheduled, scheduled_lock, force, logger)
+            entry_future.add_done_callback(functools.partial(on_entry_done, entry['video_id']))
+        
+        # Each slot is released only after its row is written, so reclaiming them all waits for the rest
+        for _ in range(max_inflight_entries):
+            inflight.acquire()
     
-    os.makedirs(os.path.dirname(os.path.abspath(output_file)), exist_ok=True)
+    writer.writerows(pending_rows)
+    written += len(pending_rows)
     
-    with open(output_file, 'w', newline='') as csvfile:
-        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-        writer.writeheader()
-        for result in results:
-            writer.writerow(result)
+    logger.info("%d entries downloaded, %d failed", written, failed)
     
-    logger.info(f"Wrote {len(results)} entries to {output_file}")
+    return written
 
 def main():
     """Main function to process DynamoDB entries and create CSV."""
@@ -169,14 +500,45 @@ def main():
     logger.info(f"Quality threshold set to {args.quality_threshold}")
     
     download_base_dir = args.download_dir
-    os.makedirs(os.path.join(download_base_dir, 'video'), exist_ok=True)
-    os.makedirs(os.path.join(download_base_dir, 'audio'), exist_ok=True)
-    os.makedirs(os.path.join(download_base_dir, 'landmarks'), exist_ok=True)
+    # Resolve the target directories once instead of per file
+    download_dirs = {name: os.path.abspath(os.path.join(download_base_dir, name))
+                     for name in ('video', 'audio', 'landmarks')}
+    for download_dir in download_dirs.values():
+        os.makedirs(download_dir, exist_ok=True)
+    
+    s3 = create_s3_client(args.region, args.workers, args.max_inflight)
     
-    results = process_dynamo_entries(args.table, download_base_dir, args.region, 
-                                    args.workers, args.quality_threshold, logger)
+    # Videos go through worker processes so large transfers are not bound by the GIL
+    video_config = ProcessTransferConfig(multipart_threshold=8 * 1024 * 1024,
+                                         multipart_chunksize=8 * 1024 * 1024,
+                                         max_request_processes=args.workers)
+    video_client_kwargs = {'region_name': args.region,
+                           'config': Config(retries={'max_attempts': 10, 'mode': 'adaptive'})}
     
-    write_to_csv(results, args.output_csv, logger)
+    os.makedirs(os.path.dirname(os.path.abspath(args.output_csv)), exist_ok=True)
+    
+    # Every HEAD and transfer holds one executor thread until it finishes, so the pool is sized to the
+    # in-flight cap; --workers only sets how many processes serve the video transfers
+    try:
+        with open(args.output_csv, 'w', newline='', buffering=1024 * 1024) as csvfile, \
+                ThreadPoolExecutor(max_workers=args.max_inflight) as executor, \
+                ProcessPoolDownloader(client_kwargs=video_client_kwargs,
+                                      config=video_config) as video_downloader:
+            entries = process_dynamo_entries(args.table, args.region, args.scan_segments, args.dataset_tag,
+                                             args.index_name, args.quality_threshold, logger)
+            # Closing the generator on any exit, including Ctrl-C, stops the scan threads feeding it
+            with contextlib.closing(entries):
+                written = download_entries(entries, download_dirs, s3, executor, video_downloader,
+                                           args.max_inflight, args.force, csvfile, logger)
+    except ClientError:
+        # Only DynamoDB read errors get here; per-file S3 errors are handled in the download functions
+        logger.error(f"Processing failed; {args.output_csv} is incomplete")
+        sys.exit(1)
+    
+    if written:
+        logger.info(f"Wrote {written} entries to {args.output_csv}")
+    else:
+        logger.warning("No results to write to CSV")
     
     logger.info("Processing complete")
 